@@ -1,131 +1,109 @@
-import re
+import asyncio
 import time
-import urllib.parse
 
-import requests
+import httpx
 import streamlit as st
 
+from ytview.api import RAPIDAPI_HOST, extract_video_id, poll_progress, request_download, run_async
+
 # ──────────────────────────── config ────────────────────────────
-RAPIDAPI_HOST = "youtube-info-download-api.p.rapidapi.com"
-DOWNLOAD_ENDPOINT = f"https://{RAPIDAPI_HOST}/ajax/download.php"
-TRANSIENT_STATUS_CODES = {502, 503, 504, 520, 522, 524}
+MAX_PROCESSING_SECONDS = 15 * 60
+# Kept below the lifetime of the signed download URLs the API hands out
+RESULT_TTL_SECONDS = 30 * 60
 
 # ──────────────────────────── page ──────────────────────────────
 st.set_page_config(page_title="YTView", layout="centered")
 st.title("YTView")
 st.caption("Paste a YouTube link and watch it right here.")
 
+
 # ── API key (loaded from .streamlit/secrets.toml) ──────────────
-api_key = st.secrets["RAPIDAPI_KEY"]
+@st.cache_resource
+def _get_headers() -> dict[str, str]:
+    """RapidAPI request headers, built once per process."""
+    return {
+        "x-rapidapi-host": RAPIDAPI_HOST,
+        "x-rapidapi-key": st.secrets["RAPIDAPI_KEY"],
+    }
 
 
 # ──────────────────────────── helpers ───────────────────────────
-def fetch_thumbnail(url: str) -> bytes | None:
-    """Download a thumbnail image and return its bytes."""
-    try:
-        resp = requests.get(url, timeout=15)
-        resp.raise_for_status()
-        return resp.content
-    except Exception:
-        return None
+# The kickoff (and its progress URL) must not outlive a finished result, or an
+# expired result would re-poll a stale job and hand out an old download URL.
+@st.cache_data(ttl=RESULT_TTL_SECONDS, show_spinner=False)
+def get_download(video_id: str) -> dict:
+    """Start (or reuse) the download job for a video. Cached per video ID."""
+    # Normalise to a full watch URL so the API always gets a consistent format
+    youtube_url = f"https://www.youtube.com/watch?v={video_id}"
+    dl_data = run_async(request_download, youtube_url, _get_headers())
+    if not dl_data.get("success"):
+        # Raise rather than return so failed responses are never cached
+        raise RuntimeError(f"API error: {dl_data}")
+    return dl_data
 
 
-def extract_video_id(url: str) -> str | None:
-    """Return the YouTube video ID from a variety of URL formats."""
-    patterns = [
-        r"(?:v=|\/v\/|youtu\.be\/|\/embed\/)([A-Za-z0-9_-]{11})",
-    ]
-    for pat in patterns:
-        m = re.search(pat, url)
-        if m:
-            return m.group(1)
-    return None
-
-
-def request_download(youtube_url: str, api_key: str) -> dict:
-    """Kick off the server-side download job and return the JSON response."""
-    params = {
-        "format": "1080",
-        "add_info": "0",
-        "url": youtube_url,
-        "audio_quality": "128",
-        "allow_extended_duration": "false",
-        "no_merge": "false",
-        "audio_language": "en",
-    }
-    headers = {
-        "x-rapidapi-host": RAPIDAPI_HOST,
-        "x-rapidapi-key": api_key,
-    }
-    resp = requests.get(DOWNLOAD_ENDPOINT, params=params, headers=headers, timeout=30)
-    resp.raise_for_status()
-    return resp.json()
+@st.cache_resource
+def _finished_videos() -> dict[str, tuple[float, dict]]:
+    """Process-wide ``video_id -> (finished_at, result)`` map shared by all sessions."""
+    return {}
 
 
-def poll_progress(progress_url: str, placeholder) -> str:
-    """Poll the progress endpoint until the file is ready. Returns the MP4 URL."""
-    bar = placeholder.progress(0, text="Processing video…")
-    started_at = time.monotonic()
-    transient_failures = 0
-    max_transient_failures = 20
-    max_total_wait_seconds = 15 * 60
+def lookup_mp4(video_id: str) -> dict | None:
+    """Return the finished ``{"mp4_url", "title"}`` result for a video, if still fresh."""
+    entry = _finished_videos().get(video_id)
+    if entry is None:
+        return None
+    finished_at, result = entry
+    if time.monotonic() - finished_at > RESULT_TTL_SECONDS:
+        _finished_videos().pop(video_id, None)
+        return None
+    return result
 
-    while True:
-        if time.monotonic() - started_at > max_total_wait_seconds:
-            raise TimeoutError("Timed out while processing video. Please try again.")
 
-        try:
-            resp = requests.get(progress_url, timeout=20)
-
-            if resp.status_code in TRANSIENT_STATUS_CODES:
-                transient_failures += 1
-                if transient_failures > max_transient_failures:
-                    raise RuntimeError(
-                        "Progress server is temporarily unavailable (502/503). "
-                        "Please retry in a moment."
-                    )
-
-                wait_seconds = min(2 + transient_failures, 10)
-                bar.progress(
-                    0,
-                    text=f"Processing video… waiting for server ({transient_failures}/{max_transient_failures})",
-                )
-                time.sleep(wait_seconds)
-                continue
-
-            resp.raise_for_status()
-            data = resp.json()
-            transient_failures = 0
-
-        except (requests.ConnectionError, requests.Timeout):
-            transient_failures += 1
-            if transient_failures > max_transient_failures:
-                raise RuntimeError("Network error while polling progress. Please retry.")
-
-            wait_seconds = min(2 + transient_failures, 10)
-            bar.progress(
-                0,
-                text=f"Processing video… reconnecting ({transient_failures}/{max_transient_failures})",
-            )
-            time.sleep(wait_seconds)
-            continue
+def _store_mp4(video_id: str, result: dict) -> None:
+    finished = _finished_videos()
+    now = time.monotonic()
+    for key, (finished_at, _) in list(finished.items()):
+        if now - finished_at > RESULT_TTL_SECONDS:
+            finished.pop(key, None)
+    finished[video_id] = (now, result)
 
-        progress = int(data.get("progress", 0))
-        pct = min(progress / 10, 100)  # progress goes 0 → 1000
-        bar.progress(int(pct), text=f"Processing video… {int(pct)}%")
 
-        if progress >= 1000:
-            raw_url = data.get("download_url")
-            if not raw_url:
-                raise RuntimeError("Processing finished, but no download URL was returned.")
+def process_video(video_id: str) -> dict:
+    """Poll the download job for a video to completion and store its result.
 
-            bar.progress(100, text="Done!")
-            # The API sometimes returns doubled slashes in the path – clean them up
-            # but keep the double slash after the scheme (https://)
-            clean_url = re.sub(r"(?<!:)/{2,}", "/", raw_url)
-            return clean_url
+    The processing view (title, thumbnail, progress bar) lives outside any cache
+    and is always cleared, even when polling fails.
+    """
+    dl_data = get_download(video_id)
+    title = dl_data.get("title", "")
+    thumb_url = dl_data.get("info", {}).get("image", "")
+    progress_url = dl_data.get("progress_url", "")
 
-        time.sleep(2)
+    status = st.empty()
+    try:
+        if not progress_url:
+            raise RuntimeError("No progress URL returned by the API.")
+        with status.container():
+            if title:
+                st.subheader(title)
+            if thumb_url:
+                # Let the browser fetch and cache the image instead of proxying bytes
+                st.image(thumb_url, use_container_width=True)
+            mp4_url = run_async(
+                poll_progress, progress_url, st.empty(), timeout=MAX_PROCESSING_SECONDS
+            )
+    except Exception:
+        # Drop the dead job so the next attempt starts a fresh one. Streamlit's
+        # stop/rerun signals derive from BaseException and pass through untouched.
+        get_download.clear(video_id)
+        raise
+    finally:
+        status.empty()
+
+    result = {"mp4_url": mp4_url, "title": title}
+    _store_mp4(video_id, result)
+    return result
 
 
 # ──────────────────────────── main ──────────────────────────────
@@ -137,57 +115,31 @@ if url_input:
         st.error("Could not parse a valid YouTube video ID from that URL.")
         st.stop()
 
-    # Normalise to a full watch URL so the API always gets a consistent format
-    canonical_url = f"https://www.youtube.com/watch?v={video_id}"
-
-    # ── Cache key so we don't re-fetch on every Streamlit rerun ──
-    cache_key = f"mp4_{video_id}"
-
-    if cache_key not in st.session_state:
+    data = lookup_mp4(video_id)
+    if data is None:
         with st.spinner("Requesting download…"):
             try:
-                dl_data = request_download(canonical_url, api_key)
-            except requests.HTTPError as exc:
+                get_download(video_id)
+            except httpx.HTTPError as exc:
                 st.error(f"API request failed: {exc}")
                 st.stop()
-
-            if not dl_data.get("success"):
-                st.error(f"API error: {dl_data}")
+            except RuntimeError as exc:
+                st.error(str(exc))
                 st.stop()
 
-            title = dl_data.get("title", "")
-            thumb_url = dl_data.get("info", {}).get("image", "")
-            thumb_bytes = fetch_thumbnail(thumb_url) if thumb_url else None
-            progress_url = dl_data.get("progress_url", "")
-
-        if title:
-            st.subheader(title)
-        if thumb_bytes:
-            st.image(thumb_bytes, use_container_width=True)
-
-        if not progress_url:
-            st.error("No progress URL returned by the API.")
-            st.stop()
-
-        progress_placeholder = st.empty()
         try:
-            mp4_url = poll_progress(progress_url, progress_placeholder)
+            data = process_video(video_id)
+        except asyncio.TimeoutError:
+            st.error("Timed out while processing video. Please try again.")
+            st.stop()
         except Exception as exc:
             st.error(f"Error while waiting for video: {exc}")
             st.stop()
 
-        st.session_state[cache_key] = {
-            "mp4_url": mp4_url,
-            "title": title,
-            "thumb_bytes": thumb_bytes,
-        }
-        st.rerun()  # rerun so the cached path renders cleanly
-    else:
-        data = st.session_state[cache_key]
-        if data["title"]:
-            st.subheader(data["title"])
-        st.video(data["mp4_url"])
-        st.markdown(
-            f"[Download MP4]({data['mp4_url']})",
-            unsafe_allow_html=True,
-        )
+    if data["title"]:
+        st.subheader(data["title"])
+    st.video(data["mp4_url"])
+    st.markdown(
+        f"[Download MP4]({data['mp4_url']})",
+        unsafe_allow_html=True,
+    )
@@ -0,0 +1,197 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+
+from ytview import api
+from ytview.api import (
+    MAX_POLL_SECONDS,
+    MAX_TRANSIENT_FAILURES,
+    MAX_RETRY_AFTER_SECONDS,
+    MIN_POLL_SECONDS,
+    _dedupe_slashes,
+    extract_video_id,
+    next_poll_delay,
+    retry_after_seconds,
+)
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("http://www.youtube.com/watch?v=0zM3nApSvMg&feature=feedrec_grec_index", "0zM3nApSvMg"),
+        ("http://www.youtube.com/watch?v=0zM3nApSvMg#t=0m10s", "0zM3nApSvMg"),
+        ("http://www.youtube.com/watch?feature=player_embedded&v=0zM3nApSvMg", "0zM3nApSvMg"),
+        ("https://m.youtube.com/watch?v=0zM3nApSvMg", "0zM3nApSvMg"),
+        ("http://www.youtube.com/v/0zM3nApSvMg?fs=1&amp;hl=en_US&amp;rel=0", "0zM3nApSvMg"),
+        ("http://www.youtube.com/embed/0zM3nApSvMg?rel=0", "0zM3nApSvMg"),
+        ("https://www.youtube-nocookie.com/embed/0zM3nApSvMg", "0zM3nApSvMg"),
+        ("https://www.youtube.com/shorts/0zM3nApSvMg", "0zM3nApSvMg"),
+        ("http://youtu.be/0zM3nApSvMg", "0zM3nApSvMg"),
+        ("http://www.youtube.com/user/IngridMichaelsonVEVO#p/a/u/1/QdK8U-VIH_o", "QdK8U-VIH_o"),
+        (
+            "http://www.youtube.com/attribution_link?a=JdfC0C9V6ZI&u=/watch?v=EhxJLojIE_o&feature=share",
+            "EhxJLojIE_o",
+        ),
+    ],
+)
+def test_extract_video_id_url_forms(url, expected):
+    assert extract_video_id(url) == expected
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "Youtube.com/watch?v=dQw4w9WgXcQ",
+        "https://www.YouTube.com/watch?v=dQw4w9WgXcQ",
+        "HTTPS://YOUTU.BE/dQw4w9WgXcQ",
+    ],
+)
+def test_extract_video_id_mixed_case_host(url):
+    assert extract_video_id(url) == "dQw4w9WgXcQ"
+
+
+def test_extract_video_id_bare_id():
+    assert extract_video_id("  dQw4w9WgXcQ \n") == "dQw4w9WgXcQ"
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://example.com/watch?v=dQw4w9WgXcQ",
+        "https://www.youtube.com/watch?v=dQw4w9WgXcQX",
+        "not a url",
+        "youtube.com/attribution_link?u" * 4000,
+    ],
+)
+def test_extract_video_id_rejects(url):
+    assert extract_video_id(url) is None
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("https://a//b///c", "https://a/b/c"),
+        ("https://a/b/c.mp4", "https://a/b/c.mp4"),
+        ("https://a//b.mp4?next=https://c//d", "https://a/b.mp4?next=https://c//d"),
+        ("a//b", "a/b"),
+        ("//a//b", "/a/b"),
+    ],
+)
+def test_dedupe_slashes(url, expected):
+    assert _dedupe_slashes(url) == expected
+
+
+def _response(retry_after=None):
+    headers = {"Retry-After": retry_after} if retry_after is not None else {}
+    return httpx.Response(503, headers=headers)
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, None),
+        ("", None),
+        ("5", 5.0),
+        ("0", 0.0),
+        ("3600", MAX_RETRY_AFTER_SECONDS),
+        ("²".encode(), None),
+        ("٣".encode(), None),
+        ("０".encode(), None),
+        ("soon", None),
+    ],
+)
+def test_retry_after_seconds(header, expected):
+    assert retry_after_seconds(_response(header)) == expected
+
+
+def test_retry_after_seconds_http_date():
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 0 < retry_after_seconds(_response(format_datetime(when, usegmt=True))) <= 30
+    past = datetime.now(timezone.utc) - timedelta(hours=1)
+    assert retry_after_seconds(_response(format_datetime(past, usegmt=True))) == 0.0
+
+
+@pytest.mark.parametrize(
+    "progress, rate, expected",
+    [
+        (0, 0.0, MAX_POLL_SECONDS),  # no movement yet: back off
+        (100, 1.0, MAX_POLL_SECONDS),  # far from done
+        (500, 100.0, 2.5),  # ~5 s left: poll at half the ETA
+        (900, 200.0, MIN_POLL_SECONDS),  # nearly done: floor
+        (960, 0.0, MIN_POLL_SECONDS),  # final stretch always polls fast
+    ],
+)
+def test_next_poll_delay(progress, rate, expected):
+    assert next_poll_delay(progress, rate) == expected
+
+
+def _run_get_with_retry(monkeypatch, handler, *, idempotent):
+    """Drive ``_get_with_retry`` against a mock transport, recording sleeps."""
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(api, "backoff_delay", lambda attempt: 1.5)
+    monkeypatch.setattr(api.asyncio, "sleep", fake_sleep)
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await api._get_with_retry(client, "https://p/x", idempotent=idempotent)
+
+    return asyncio.run(main()), sleeps
+
+
+def test_get_with_retry_never_sleeps_below_backoff(monkeypatch):
+    codes = iter([503, 429, 200])
+
+    def handler(request):
+        return httpx.Response(next(codes), headers={"Retry-After": "0"})
+
+    resp, sleeps = _run_get_with_retry(monkeypatch, handler, idempotent=True)
+    assert resp.status_code == 200
+    assert sleeps == [1.5, 1.5]
+
+
+def test_get_with_retry_returns_transient_status_once_when_not_idempotent(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(503)
+
+    resp, sleeps = _run_get_with_retry(monkeypatch, handler, idempotent=False)
+    assert resp.status_code == 503
+    assert len(requests) == 1
+    assert sleeps == []
+
+
+def test_get_with_retry_raises_transport_error_once_when_not_idempotent(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        raise httpx.ConnectError("boom", request=request)
+
+    with pytest.raises(httpx.ConnectError):
+        _run_get_with_retry(monkeypatch, handler, idempotent=False)
+    assert len(requests) == 1
+
+
+@pytest.mark.parametrize("failure", ["status", "transport"])
+def test_get_with_retry_gives_up_after_max_failures_when_idempotent(monkeypatch, failure):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if failure == "transport":
+            raise httpx.ConnectError("boom", request=request)
+        return httpx.Response(503)
+
+    with pytest.raises(RuntimeError):
+        _run_get_with_retry(monkeypatch, handler, idempotent=True)
+    # The first attempt plus MAX_TRANSIENT_FAILURES retries
+    assert len(requests) == MAX_TRANSIENT_FAILURES + 1
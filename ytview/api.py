@@ -0,0 +1,219 @@
+"""RapidAPI download client and URL helpers shared by the YTView app."""
+
+import asyncio
+import email.utils
+import json
+import random
+import re
+import string
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# ──────────────────────────── config ────────────────────────────
+RAPIDAPI_HOST = "youtube-info-download-api.p.rapidapi.com"
+DOWNLOAD_ENDPOINT = f"https://{RAPIDAPI_HOST}/ajax/download.php"
+TRANSIENT_STATUS_CODES = {429, 502, 503, 504, 520, 522, 524}
+MAX_TRANSIENT_FAILURES = 20
+MAX_RETRY_AFTER_SECONDS = 60.0
+MIN_POLL_SECONDS = 0.5
+MAX_POLL_SECONDS = 5.0
+
+_BASE_PARAMS = (
+    ("format", "1080"),
+    ("add_info", "0"),
+    ("audio_quality", "128"),
+    ("allow_extended_duration", "false"),
+    ("no_merge", "false"),
+    ("audio_language", "en"),
+)
+
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+# Covers watch/embed/v/shorts/attribution_link/#p/ forms on youtube.com and
+# youtube-nocookie.com plus youtu.be. The `[^ ]*` runs backtrack, so matching is
+# quadratic in the worst case – extract_video_id caps the input length first.
+_VIDEO_ID_RE = re.compile(
+    r"(?:youtu\.be/|youtube(?:-nocookie)?\.com/"
+    r"(?:watch\?(?:[^ ]*&)?v=|embed/|v/|shorts/|attribution_link\?[^ ]*u=/watch\?v="
+    r"|(?:user|c|channel)/[^/]+#p/[a-z]/u/\d+/))"
+    r"([A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])",
+    re.IGNORECASE,
+)
+_MAX_URL_LENGTH = 2048
+_ID_CHARS = frozenset(string.ascii_letters + string.digits + "_-")
+
+
+# ──────────────────────────── helpers ───────────────────────────
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with jitter so concurrent clients don't retry in lockstep."""
+    return min(1.0 * (2 ** attempt), 30.0) * (1.0 + random.uniform(0, 0.5))
+
+
+def retry_after_seconds(resp: httpx.Response) -> float | None:
+    """Parse a ``Retry-After`` header (delta-seconds or HTTP-date) into seconds.
+
+    The result is clamped to ``MAX_RETRY_AFTER_SECONDS`` so a long server-directed
+    wait can't silently eat the whole processing deadline.
+    """
+    retry_after = resp.headers.get("Retry-After", "").strip()
+    if not retry_after:
+        return None
+    if retry_after.isascii() and retry_after.isdigit():
+        seconds = float(int(retry_after))
+    else:
+        try:
+            when = email.utils.parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER_SECONDS)
+
+
+def next_poll_delay(progress: int, rate: float) -> float:
+    """Seconds until the next poll, given progress (0–1000) and its rate per second.
+
+    Polls back off to ``MAX_POLL_SECONDS`` while completion is far away and
+    tighten to ``MIN_POLL_SECONDS`` as it approaches.
+    """
+    if progress > 950:
+        return MIN_POLL_SECONDS
+    eta = (1000 - progress) / max(rate, 1)
+    return max(MIN_POLL_SECONDS, min(MAX_POLL_SECONDS, eta / 2))
+
+
+async def _get_with_retry(
+    client: httpx.AsyncClient, url: str, *, idempotent: bool, on_retry=None, **kwargs
+) -> httpx.Response:
+    """GET ``url``, retrying transient failures with backoff if the call is idempotent.
+
+    Only idempotent calls are retried. Repeating a non-idempotent one (such as the
+    download kickoff, which may bill API credits per call) could charge the user
+    twice, so its failures are surfaced immediately. ``on_retry(reason, attempt)``
+    is called before each backoff sleep.
+    """
+    failures = 0
+    while True:
+        try:
+            resp = await client.get(url, **kwargs)
+        except httpx.TransportError as exc:
+            if not idempotent:
+                raise
+            failures += 1
+            if failures > MAX_TRANSIENT_FAILURES:
+                raise RuntimeError("Network error while contacting the server. Please retry.") from exc
+            wait_seconds = backoff_delay(failures)
+            reason = "reconnecting"
+        else:
+            if not idempotent or resp.status_code not in TRANSIENT_STATUS_CODES:
+                return resp
+            failures += 1
+            if failures > MAX_TRANSIENT_FAILURES:
+                raise RuntimeError(
+                    f"Server is temporarily unavailable ({resp.status_code}). "
+                    "Please retry in a moment."
+                )
+            # Never go below the backoff: "Retry-After: 0" must not burn the budget
+            wait_seconds = max(retry_after_seconds(resp) or 0.0, backoff_delay(failures))
+            reason = "waiting for server"
+
+        if on_retry is not None:
+            on_retry(reason, failures)
+        await asyncio.sleep(wait_seconds)
+
+
+def _dedupe_slashes(u: str) -> str:
+    """Collapse repeated slashes in a URL path, keeping the one after the scheme."""
+    scheme, sep, rest = u.partition("://")
+    if not sep:
+        scheme, rest = "", u
+    path, q, query = rest.partition("?")
+    while "//" in path:
+        path = path.replace("//", "/")
+    rest = path + q + query
+    return f"{scheme}://{rest}" if scheme else rest
+
+
+def extract_video_id(url: str) -> str | None:
+    """Return the YouTube video ID from a variety of URL formats."""
+    # Bare IDs are common input – skip the regex engine for them
+    s = url.strip()
+    if len(s) == 11 and set(s) <= _ID_CHARS:
+        return s
+    if len(s) > _MAX_URL_LENGTH:
+        return None
+    m = _VIDEO_ID_RE.search(s)
+    return m.group(1) if m else None
+
+
+async def request_download(client: httpx.AsyncClient, youtube_url: str, headers: dict) -> dict:
+    """Kick off the server-side download job and return the JSON response."""
+    params = _BASE_PARAMS + (("url", youtube_url),)
+    resp = await _get_with_retry(
+        client, DOWNLOAD_ENDPOINT, idempotent=False, params=params, headers=headers
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def _with_client(fn, *args):
+    async with httpx.AsyncClient(timeout=30, http2=True) as client:
+        return await fn(client, *args)
+
+
+def run_async(fn, *args, timeout: float | None = None):
+    """Run ``fn(client, *args)`` on a fresh event loop with its own pooled AsyncClient.
+
+    With ``timeout``, the whole run is cancelled at the next await once it is exceeded.
+    """
+    return asyncio.run(asyncio.wait_for(_with_client(fn, *args), timeout))
+
+
+async def poll_progress(client: httpx.AsyncClient, progress_url: str, placeholder) -> str:
+    """Poll the progress endpoint until the file is ready. Returns the MP4 URL."""
+    bar = placeholder.progress(0, text="Processing video…")
+    t_prev, p_prev = time.monotonic(), 0
+    last_pct = -1
+
+    def on_retry(reason: str, attempt: int) -> None:
+        nonlocal last_pct
+        last_pct = -1  # force a redraw once polling recovers
+        bar.progress(0, text=f"Processing video… {reason} ({attempt}/{MAX_TRANSIENT_FAILURES})")
+
+    while True:
+        resp = await _get_with_retry(
+            client, progress_url, idempotent=True, on_retry=on_retry, timeout=20
+        )
+        resp.raise_for_status()
+        data = _json_loads(resp.content)
+
+        progress = int(data.get("progress", 0))
+        now = time.monotonic()
+        rate = (progress - p_prev) / (now - t_prev) if now > t_prev else 0.0
+        t_prev, p_prev = now, progress
+        pct = min(progress / 10, 100)  # progress goes 0 → 1000
+        # Only redraw when the whole percentage changes to spare websocket traffic
+        if int(pct) != last_pct:
+            bar.progress(int(pct), text=f"Processing video… {int(pct)}%")
+            last_pct = int(pct)
+
+        if progress >= 1000:
+            raw_url = data.get("download_url")
+            if not raw_url:
+                raise RuntimeError("Processing finished, but no download URL was returned.")
+
+            bar.progress(100, text="Done!")
+            # The API sometimes returns doubled slashes in the path – clean them up
+            # but keep the double slash after the scheme (https://)
+            clean_url = _dedupe_slashes(raw_url)
+            return clean_url
+
+        await asyncio.sleep(next_poll_delay(progress, rate))